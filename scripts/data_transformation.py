@@ -8,181 +8,299 @@ and health score calculation.
 Author: Franklin Le
 """
 
+import csv
+import io
+import re
+
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from pathlib import Path
 
 
-def clean_european_number(value):
+def clean_european_number(series):
     """
-    Convert European number format to standard float.
+    Convert a column of European-formatted numbers to standard floats.
     European: 5 191,16 -> 5191.16 (space=thousands, comma=decimal)
+    Missing or unparseable values become 0.0.
     """
-    if pd.isna(value):
-        return 0.0
-    if isinstance(value, (int, float)):
-        return float(value)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.fillna(0.0).astype('float64')
 
     # Remove spaces (thousands separator) and replace comma with period
-    cleaned = str(value).replace(' ', '').replace(',', '.')
-    try:
-        return float(cleaned)
-    except ValueError:
-        return 0.0
+    cleaned = (
+        series.astype('string')
+        .str.replace(' ', '', regex=False)
+        .str.replace(',', '.', regex=False)
+    )
+    return pd.to_numeric(cleaned, errors='coerce').fillna(0.0).astype('float64')
+
+
+CATEGORY_KEYWORDS = {
+    'Electronics & Home': ['electronic', 'cable', 'charger', 'adapter', 'battery',
+                           'home', 'kitchen', 'appliance', 'tool'],
+    'Fragrances': ['perfume', 'cologne', 'fragrance', 'scent', 'eau de'],
+    'Beauty & Skincare': ['beauty', 'skincare', 'cream', 'lotion', 'makeup',
+                          'cosmetic', 'serum', 'face'],
+    'Consumables & Health': ['vitamin', 'supplement', 'health', 'protein',
+                              'snack', 'food', 'drink', 'consumable'],
+    'Collectibles & Toys': ['toy', 'collectible', 'figure', 'game', 'puzzle', 'lego'],
+    'Apparel & Footwear': ['shirt', 'pants', 'shoes', 'clothing', 'apparel',
+                           'jacket', 'dress', 'footwear'],
+    'Drinkware': ['mug', 'cup', 'bottle', 'tumbler', 'glass', 'drinkware'],
+    'Sports': ['sport', 'fitness', 'exercise', 'gym', 'outdoor', 'athletic'],
+    'Media & Entertainment': ['book', 'dvd', 'cd', 'media', 'movie', 'music'],
+}
+
+# One alternation per category, compiled once at import. Keywords are
+# lowercase and names are lowercased up front, so matching is case-sensitive.
+CATEGORY_PATTERNS = {
+    category: re.compile('|'.join(map(re.escape, keywords)))
+    for category, keywords in CATEGORY_KEYWORDS.items()
+}
+
+
+def assign_category(product_names):
+    """
+    Assign product category based on keywords in product name.
+    Returns one of 10 predefined categories per name; when several
+    categories match, the first one in CATEGORY_KEYWORDS wins.
+
+    Each category pattern only scans the names that no earlier category
+    has claimed, so every name stops being searched at its first hit.
+    """
+    names = product_names.astype('string').str.lower()
+    categories = np.full(len(names), 'Other', dtype=object)
+    pending = np.arange(len(names))
+
+    for category, pattern in CATEGORY_PATTERNS.items():
+        hits = names.iloc[pending].str.contains(pattern, regex=True, na=False).to_numpy(dtype=bool)
+        categories[pending[hits]] = category
+        pending = pending[~hits]
+        if len(pending) == 0:
+            break
 
+    return pd.Series(categories, index=product_names.index)
 
-def assign_category(product_name):
+
+def score_dimension(values, edges, deltas):
     """
-    Assign product category based on keywords in product name.
-    Returns one of 10 predefined categories.
+    Look up a score delta per value from ascending lower bin edges.
+    A value scores deltas[i] when edges[i-1] <= value < edges[i]; NaN scores 0.
     """
-    name_lower = str(product_name).lower()
-
-    category_keywords = {
-        'Electronics & Home': ['electronic', 'cable', 'charger', 'adapter', 'battery',
-                               'home', 'kitchen', 'appliance', 'tool'],
-        'Fragrances': ['perfume', 'cologne', 'fragrance', 'scent', 'eau de'],
-        'Beauty & Skincare': ['beauty', 'skincare', 'cream', 'lotion', 'makeup',
-                              'cosmetic', 'serum', 'face'],
-        'Consumables & Health': ['vitamin', 'supplement', 'health', 'protein',
-                                  'snack', 'food', 'drink', 'consumable'],
-        'Collectibles & Toys': ['toy', 'collectible', 'figure', 'game', 'puzzle', 'lego'],
-        'Apparel & Footwear': ['shirt', 'pants', 'shoes', 'clothing', 'apparel',
-                               'jacket', 'dress', 'footwear'],
-        'Drinkware': ['mug', 'cup', 'bottle', 'tumbler', 'glass', 'drinkware'],
-        'Sports': ['sport', 'fitness', 'exercise', 'gym', 'outdoor', 'athletic'],
-        'Media & Entertainment': ['book', 'dvd', 'cd', 'media', 'movie', 'music'],
-    }
-
-    for category, keywords in category_keywords.items():
-        if any(kw in name_lower for kw in keywords):
-            return category
-
-    return 'Other'
-
-
-def calculate_health_score(row):
+    values = np.asarray(values, dtype=np.float64)
+    scored = np.asarray(deltas, dtype=np.int8)[np.digitize(values, edges)]
+    return np.where(np.isnan(values), 0, scored)
+
+
+def calculate_health_score(net_profit, units, roi, margin):
     """
     Calculate composite health score (0-100) based on four performance dimensions:
     - Profit contribution
     - Sales velocity (units sold)
     - ROI percentage
     - Margin percentage
+
+    Takes the metric columns as NumPy arrays and scores each dimension with a
+    branchless np.digitize lookup. A "> x" threshold uses the next float above x
+    as its bin edge, so the > / < / == boundaries are exact.
     """
-    score = 50  # Base score
-
-    # Profit contribution (max +20 / min -15)
-    net_profit = row.get('Net_Profit', 0)
-    if net_profit > 500:
-        score += 20
-    elif net_profit > 200:
-        score += 15
-    elif net_profit > 100:
-        score += 10
-    elif net_profit > 50:
-        score += 5
-    elif net_profit < 0:
-        score -= 15
-
-    # Velocity/Units sold (max +15 / min -10)
-    units = row.get('Units_Sold', 0)
-    if units > 50:
-        score += 15
-    elif units > 25:
-        score += 10
-    elif units > 10:
-        score += 5
-    elif units == 0:
-        score -= 10
-
-    # ROI (max +10 / min -10)
-    roi = row.get('ROI_Pct', 0)
-    if roi > 50:
-        score += 10
-    elif roi > 25:
-        score += 5
-    elif roi < 0:
-        score -= 10
-
-    # Margin (max +5 / min -5)
-    margin = row.get('Margin_Pct', 0)
-    if margin > 20:
-        score += 5
-    elif margin < 5:
-        score -= 5
-
-    return max(0, min(100, score))
+    def above(x):
+        return np.nextafter(x, np.inf)
+
+    # Profit contribution (max +20 / min -15): <0, 0-50, >50, >100, >200, >500
+    profit_delta = score_dimension(
+        net_profit, [0, above(50), above(100), above(200), above(500)], [-15, 0, 5, 10, 15, 20]
+    )
+
+    # Velocity/Units sold (max +15 / min -10): <0, ==0, 0-10, >10, >25, >50
+    units_delta = score_dimension(
+        units, [0, above(0), above(10), above(25), above(50)], [0, -10, 0, 5, 10, 15]
+    )
+
+    # ROI (max +10 / min -10): <0, 0-25, >25, >50
+    roi_delta = score_dimension(roi, [0, above(25), above(50)], [-10, 0, 5, 10])
+
+    # Margin (max +5 / min -5): <5, 5-20, >20
+    margin_delta = score_dimension(margin, [5, above(20)], [-5, 0, 5])
+
+    score = np.full(len(net_profit), 50, dtype=np.int16)  # Base score
+    score += profit_delta
+    score += units_delta
+    score += roi_delta
+    score += margin_delta
+    return np.clip(score, 0, 100, out=score)
 
 
 def assign_performance_tier(health_score):
     """
     Assign performance tier based on health score.
+    Bins: Star >= 80, Strong >= 60, Average >= 45, Weak below 45.
     """
-    if health_score >= 80:
-        return 'Star'
-    elif health_score >= 60:
-        return 'Strong'
-    elif health_score >= 45:
-        return 'Average'
-    else:
-        return 'Weak'
+    return pd.cut(
+        health_score,
+        bins=[-np.inf, 45, 60, 80, np.inf],
+        labels=['Weak', 'Average', 'Strong', 'Star'],
+        right=False
+    )
 
 
-def process_sku_data(input_path, output_path):
+def safe_divide(numerator, denominator, mask, scale=1):
     """
-    Process raw SKU-level data from Sellerboard export.
+    Element-wise numerator / denominator * scale where mask is True, 0 elsewhere.
+    Writes into a single preallocated buffer instead of np.where temporaries.
     """
-    print(f"Processing SKU data from {input_path}...")
+    out = np.zeros(len(numerator), dtype=np.float64)
+    np.divide(numerator, denominator, out=out, where=mask)
+    if scale != 1:
+        out *= scale
+    return out
 
-    # Read raw data
-    df = pd.read_csv(input_path)
 
+def write_output(df, output_path):
+    """
+    Save processed data as CSV (for Tableau and SQLite) plus a typed,
+    zstd-compressed Parquet copy next to it for fast reloads.
+    """
+    output_path = Path(output_path)
+
+    # Convert to Arrow once; both writers consume the same table
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Dates are daily, so the CSV gets YYYY-MM-DD instead of full timestamps
+    csv_table = table
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            csv_table = csv_table.set_column(i, field.name, pc.cast(table.column(i), pa.date32()))
+
+    # pyarrow quotes every header and string field even with quoting_style='needed',
+    # so keep the committed CSVs' unquoted layout: header via the csv module, body
+    # unquoted, falling back to quoted fields only when a value contains a delimiter
+    header = io.StringIO()
+    csv.writer(header, lineterminator='\n').writerow(csv_table.column_names)
+    with open(output_path, 'wb') as f:
+        f.write(header.getvalue().encode('utf-8'))
+        body_start = f.tell()
+        try:
+            pacsv.write_csv(csv_table, f, write_options=pacsv.WriteOptions(
+                include_header=False, batch_size=65536, quoting_style='none'))
+        except pa.ArrowInvalid:
+            f.seek(body_start)
+            f.truncate()
+            pacsv.write_csv(csv_table, f, write_options=pacsv.WriteOptions(
+                include_header=False, batch_size=65536, quoting_style='needed'))
+    pq.write_table(table, output_path.with_suffix('.parquet'), compression='zstd')
+
+
+def load_output(output_path):
+    """
+    Load processed data, preferring the Parquet copy when it exists and is
+    at least as new as the CSV (the committed source of truth).
+    """
+    output_path = Path(output_path)
+    parquet_path = output_path.with_suffix('.parquet')
+    if parquet_path.exists() and (
+        not output_path.exists()
+        or parquet_path.stat().st_mtime >= output_path.stat().st_mtime
+    ):
+        return pd.read_parquet(parquet_path, engine='pyarrow')
+    return pd.read_csv(output_path)
+
+
+def is_up_to_date(input_path, output_path):
+    """
+    Check whether output_path (CSV) and its Parquet copy both exist and are
+    newer than input_path.
+    """
+    output_path = Path(output_path)
+    input_mtime = Path(input_path).stat().st_mtime
+    for path in (output_path, output_path.with_suffix('.parquet')):
+        if not path.exists() or path.stat().st_mtime <= input_mtime:
+            return False
+    return True
+
+
+def load_or_process(process, input_path, output_path):
+    """
+    Reload output_path if it is up to date, otherwise rebuild it with process.
+    """
+    if is_up_to_date(input_path, output_path):
+        print(f"{output_path} is up to date with {input_path}, skipping processing.")
+        return load_output(output_path)
+    return process(input_path, output_path)
+
+
+def transform_sku_data(df):
+    """
+    Clean raw SKU rows and add derived metrics, health score and tier.
+    Every step is row-local, so this can run on one chunk at a time.
+    """
     # Clean numeric columns (handle European formatting if present)
     numeric_cols = ['Revenue', 'COGS', 'Amazon_Fees', 'Net_Profit']
     for col in numeric_cols:
         if col in df.columns:
-            df[col] = df[col].apply(clean_european_number)
-
-    # Calculate derived metrics
-    df['Margin_Pct'] = np.where(
-        df['Revenue'] > 0,
-        (df['Net_Profit'] / df['Revenue']) * 100,
-        0
-    )
+            df[col] = clean_european_number(df[col])
+
+    # Calculate derived metrics (each mask is computed once and reused)
+    revenue = df['Revenue'].to_numpy(dtype=np.float64)
+    cogs = np.abs(df['COGS'].to_numpy(dtype=np.float64))
+    net_profit = df['Net_Profit'].to_numpy(dtype=np.float64)
+    units = df['Units_Sold'].to_numpy(dtype=np.float64)
+    refunds = df['Refunds'].to_numpy(dtype=np.float64)
+    has_revenue = revenue > 0
+    has_cogs = cogs > 0
+    has_units = units > 0
+
+    margin = safe_divide(net_profit, revenue, has_revenue, scale=100)
+    roi = safe_divide(net_profit, cogs, has_cogs, scale=100)
+    df['Margin_Pct'] = margin
+    df['ROI_Pct'] = roi
+    df['Refund_Rate_Pct'] = safe_divide(refunds, units, has_units, scale=100)
+    df['Avg_Sale_Price'] = safe_divide(revenue, units, has_units)
+    df['Profit_Per_Unit'] = safe_divide(net_profit, units, has_units)
+
+    # Calculate health score and tier straight from the metric arrays
+    df['Health_Score'] = calculate_health_score(net_profit, units, roi, margin)
+    df['Performance_Tier'] = assign_performance_tier(df['Health_Score'])
+
+    # Downcast to the narrowest dtypes that hold the values. Money columns
+    # stay float64 so portfolio totals keep exact cents at scale.
+    ratio_cols = ['Margin_Pct', 'ROI_Pct', 'Refund_Rate_Pct', 'Avg_Sale_Price', 'Profit_Per_Unit']
+    df[ratio_cols] = df[ratio_cols].astype('float32')
+    df['Units_Sold'] = df['Units_Sold'].astype('Int32')  # nullable: missing stays missing
+    df['Health_Score'] = df['Health_Score'].astype('int8')
 
-    df['ROI_Pct'] = np.where(
-        df['COGS'].abs() > 0,
-        (df['Net_Profit'] / df['COGS'].abs()) * 100,
-        0
-    )
+    return df
 
-    df['Refund_Rate_Pct'] = np.where(
-        df['Units_Sold'] > 0,
-        (df['Refunds'] / df['Units_Sold']) * 100,
-        0
-    )
 
-    df['Avg_Sale_Price'] = np.where(
-        df['Units_Sold'] > 0,
-        df['Revenue'] / df['Units_Sold'],
-        0
-    )
+def process_sku_data(input_path, output_path, chunksize=None):
+    """
+    Process raw SKU-level data from Sellerboard export.
+    Pass chunksize to stream large exports instead of loading them whole.
+    """
+    print(f"Processing SKU data from {input_path}...")
 
-    df['Profit_Per_Unit'] = np.where(
-        df['Units_Sold'] > 0,
-        df['Net_Profit'] / df['Units_Sold'],
-        0
-    )
+    if chunksize:
+        # The pyarrow engine cannot stream, so chunked reads use the C parser
+        reader = pd.read_csv(input_path, chunksize=chunksize)
+        df = pd.concat((transform_sku_data(chunk) for chunk in reader), ignore_index=True)
+    else:
+        # Read raw data (pyarrow's multithreaded parser)
+        df = transform_sku_data(pd.read_csv(input_path, engine='pyarrow'))
 
-    # Calculate health score and tier
-    df['Health_Score'] = df.apply(calculate_health_score, axis=1)
-    df['Performance_Tier'] = df['Health_Score'].apply(assign_performance_tier)
+    # Store labels as categories (after concat, so chunks share one dtype)
+    if 'Category' in df.columns:
+        df['Category'] = df['Category'].astype('category')
 
     # Anonymize SKUs
-    df['SKU'] = [f'SKU-{str(i+1).zfill(4)}' for i in range(len(df))]
+    sku_numbers = pd.Series(np.arange(1, len(df) + 1), index=df.index).astype('string')
+    df['SKU'] = 'SKU-' + sku_numbers.str.zfill(4)
 
     # Save processed data
-    df.to_csv(output_path, index=False)
+    write_output(df, output_path)
     print(f"Saved {len(df)} SKUs to {output_path}")
 
     return df
@@ -194,38 +312,35 @@ def process_daily_data(input_path, output_path):
     """
     print(f"Processing daily data from {input_path}...")
 
-    # Read raw data
-    df = pd.read_csv(input_path)
+    # Read raw data (pyarrow's multithreaded parser)
+    df = pd.read_csv(input_path, engine='pyarrow')
 
     # Ensure date is properly formatted
-    df['Date'] = pd.to_datetime(df['Date'])
+    df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
     df = df.sort_values('Date')
 
-    # Calculate 7-day moving averages
-    df['Profit_7day_MA'] = df['Net_Profit'].rolling(window=7, min_periods=1).mean()
-    df['Units_7day_MA'] = df['Units_Sold'].rolling(window=7, min_periods=1).mean()
-    df['Revenue_7day_MA'] = df['Revenue'].rolling(window=7, min_periods=1).mean()
+    # Calculate 7-day moving averages in a single rolling pass
+    rolling = df[['Net_Profit', 'Units_Sold', 'Revenue']].rolling(window=7, min_periods=1).mean()
+    df[['Profit_7day_MA', 'Units_7day_MA', 'Revenue_7day_MA']] = rolling.to_numpy()
 
     # Add time-based columns
     df['Day_of_Week'] = df['Date'].dt.day_name()
     df['Week_Number'] = df['Date'].dt.isocalendar().week
 
     # Calculate conversion rate
-    df['Conversion_Rate_Pct'] = np.where(
-        df['Sessions'] > 0,
-        (df['Orders'] / df['Sessions']) * 100,
-        0
+    sessions = df['Sessions'].to_numpy(dtype=np.float64)
+    df['Conversion_Rate_Pct'] = safe_divide(
+        df['Orders'].to_numpy(dtype=np.float64), sessions, sessions > 0, scale=100
     )
 
     # Calculate daily margin
-    df['Margin_Pct'] = np.where(
-        df['Revenue'] > 0,
-        (df['Net_Profit'] / df['Revenue']) * 100,
-        0
+    revenue = df['Revenue'].to_numpy(dtype=np.float64)
+    df['Margin_Pct'] = safe_divide(
+        df['Net_Profit'].to_numpy(dtype=np.float64), revenue, revenue > 0, scale=100
     )
 
     # Save processed data
-    df.to_csv(output_path, index=False)
+    write_output(df, output_path)
     print(f"Saved {len(df)} daily records to {output_path}")
 
     return df
@@ -254,23 +369,26 @@ def generate_summary_stats(sku_df, daily_df):
 
     # Category breakdown
     print("\nCategory Performance:")
-    category_stats = sku_df.groupby('Category').agg({
-        'Net_Profit': 'sum',
-        'SKU': 'count'
-    }).sort_values('Net_Profit', ascending=False)
+    category_stats = sku_df[['Category', 'Net_Profit', 'SKU']].groupby(
+        'Category', observed=True, sort=False
+    ).agg(
+        profit=('Net_Profit', 'sum'),
+        skus=('SKU', 'count')
+    ).sort_values('profit', ascending=False)
+    category_stats['pct'] = category_stats['profit'] / total_profit * 100
 
-    for cat, row in category_stats.iterrows():
-        pct = row['Net_Profit'] / total_profit * 100
-        print(f"  {cat}: ${row['Net_Profit']:,.2f} ({pct:.1f}%) - {int(row['SKU'])} SKUs")
+    for row in category_stats.itertuples():
+        print(f"  {row.Index}: ${row.profit:,.2f} ({row.pct:.1f}%) - {row.skus} SKUs")
 
     # Tier distribution
     print("\nPerformance Tier Distribution:")
-    tier_stats = sku_df['Performance_Tier'].value_counts()
-    for tier in ['Star', 'Strong', 'Average', 'Weak']:
-        if tier in tier_stats:
-            count = tier_stats[tier]
-            pct = count / len(sku_df) * 100
-            print(f"  {tier}: {count} ({pct:.0f}%)")
+    tier_counts = sku_df['Performance_Tier'].value_counts().reindex(
+        ['Star', 'Strong', 'Average', 'Weak'], fill_value=0
+    )
+    tier_counts = tier_counts[tier_counts > 0]
+    tier_pcts = tier_counts / len(sku_df) * 100
+    for tier, count, pct in zip(tier_counts.index, tier_counts, tier_pcts):
+        print(f"  {tier}: {count} ({pct:.0f}%)")
 
 
 def main():
@@ -281,16 +399,22 @@ def main():
     base_path = Path(__file__).parent.parent
     data_path = base_path / 'data'
 
-    # Process SKU data (assuming raw file exists)
+    # Raw Sellerboard exports and processed outputs
+    sku_input = data_path / 'raw_sku_data.csv'
+    daily_input = data_path / 'raw_daily_data.csv'
     sku_output = data_path / 'tableau_sku_data.csv'
     daily_output = data_path / 'tableau_daily_data.csv'
 
-    # Check if processed files already exist
-    if sku_output.exists() and daily_output.exists():
+    if sku_input.exists() and daily_input.exists():
+        # Only rebuild outputs that are older than their raw export
+        sku_df = load_or_process(process_sku_data, sku_input, sku_output)
+        daily_df = load_or_process(process_daily_data, daily_input, daily_output)
+        generate_summary_stats(sku_df, daily_df)
+    elif sku_output.exists() and daily_output.exists():
         print("Processed data files already exist.")
         print("Loading existing files for summary...")
-        sku_df = pd.read_csv(sku_output)
-        daily_df = pd.read_csv(daily_output)
+        sku_df = load_output(sku_output)
+        daily_df = load_output(daily_output)
         generate_summary_stats(sku_df, daily_df)
     else:
         print("Raw data files not found. Please place Sellerboard exports in data/ directory.")